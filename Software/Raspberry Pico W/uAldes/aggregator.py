@@ -0,0 +1,524 @@
+"""
+MIT License
+
+Copyright (c) 2025 Yann DOUBLET
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import json
+import ssl
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import ualdes
+import ulog
+"""
+Aggregator - Server-side decoding of uAldes frames
+
+This script runs on CPython (a server, not the Pico W). It subscribes to the
+<main>trame topic of many gateways, decodes the raw frames with ualdes and
+republishes the decoded fields under the prefix of each gateway, exactly as
+main.py does on a gateway. Gateways can then run with
+UALDES_OPTIONS["decode"] = False and only publish their raw frames.
+
+Frames are queued (the MQTT reader is paused when the queue is full, and the
+client library keeps at most as many messages in its own queue), deduped per
+gateway, decoded by batches and, when the incoming rate is high, spread over
+a process pool.
+
+Author: Yann DOUBLET
+License: MIT
+"""
+RELEASE_DATE = "19_10_2026"
+VERSION = "1.0"
+
+# Try to import the options from config.py, otherwise use local definitions
+try:
+    from config import MQTT_CONFIG, AGGREGATOR_OPTIONS
+except (ImportError, AttributeError):
+    MQTT_CONFIG = {
+        "broker": "localhost",
+        "port": 1883,
+        "client_id": "aldes",
+        "user": None,
+        "password": None,
+        "keepalive": 60,
+    }
+    AGGREGATOR_OPTIONS = {
+        "gateways": ["+/"],
+        "queue_size": 1000,
+        "batch_size": 64,
+        "batch_interval": 0.05,
+        "pool_workers": 0,
+        "pool_threshold": 10000,
+        "dedupe_window": 5,
+        "retain": True,
+        "retain_interval": 300,
+        "metrics_interval": 60,
+    }
+
+# Invalid frames are counted per gateway in DeviceStats, keep ualdes quiet
+ulog.level = ulog.ERROR
+
+FRAME_TOPIC = "trame"
+METRICS_TOPIC = "metrics"
+
+# Window in seconds used to compute the throughput
+RATE_WINDOW = 10
+
+# Shorter frames do not contain every item of ITEMS_MAPPING
+MIN_FRAME_LENGTH = max(properties["Index"] for properties in ualdes.ITEMS_MAPPING.values()) + 1
+
+
+def topic_matches(topic_filter, topic):
+    """
+    Returns True if the topic matches the MQTT topic filter.
+    The '+' wildcard matches exactly one level, '#' matches all remaining levels.
+    :param topic_filter: MQTT subscription filter, e.g. "+/trame"
+    :param topic: topic of a published message, e.g. "aldes/trame"
+    :return: True if the topic matches the filter
+    """
+
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    for i, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if i >= len(topic_levels):
+            return False
+        if level != "+" and level != topic_levels[i]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+def parse_frame(payload):
+    """
+    Converts a <main>trame payload back into the raw frame.
+    main.py publishes the frame as space separated hexadecimal bytes ("33 ff 4c ...").
+    :param payload: bytes or str received on the trame topic
+    :return: bytes of the frame, or None if the payload is not a valid frame
+    """
+
+    if isinstance(payload, (bytes, bytearray)):
+        payload = payload.decode("ascii", "ignore")
+    try:
+        frame = bytes.fromhex(payload)
+    except ValueError:
+        return None
+    return frame if len(frame) >= MIN_FRAME_LENGTH else None
+
+
+def decode_batch(frames):
+    """
+    Decodes a list of frames with ualdes.frame_decode.
+    Defined at module level so that it can be run in a worker of the process pool.
+    :param frames: list of bytes
+    :return: list of decoded dictionaries (None for invalid frames), in the same order
+    """
+
+    decoded = []
+    for frame in frames:
+        # A malformed frame must not stop the decoding of the rest of the batch
+        try:
+            decoded.append(ualdes.frame_decode(frame))
+        except Exception:
+            decoded.append(None)
+    return decoded
+
+
+class DeviceStats:
+    """
+    Throughput counters of one gateway.
+    """
+
+    def __init__(self):
+        self.received = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.decoded = 0
+        self.published = 0
+        self.last_frame = None
+        self.last_frame_time = 0
+        self.retained = {}
+        self._arrivals = deque()
+
+    def arrival(self, now):
+        self.received += 1
+        self._arrivals.append(now)
+        while self._arrivals and now - self._arrivals[0] > RATE_WINDOW:
+            self._arrivals.popleft()
+
+    def rate(self, now):
+        while self._arrivals and now - self._arrivals[0] > RATE_WINDOW:
+            self._arrivals.popleft()
+        return len(self._arrivals) / RATE_WINDOW
+
+    def as_dict(self, now):
+        return {
+            "received": self.received,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "decoded": self.decoded,
+            "published": self.published,
+            "rate": round(self.rate(now), 2),
+        }
+
+
+class Aggregator:
+    """
+    Decodes the frames published by many gateways and republishes the decoded fields.
+
+    Parameters:
+    -----------
+    client : object
+        MQTT client with the coroutines subscribe(topic), publish(topic, msg, retain=False)
+        and the asynchronous generator messages() yielding (topic, payload) tuples.
+        See LocalClient and AiomqttClient.
+    options : dict
+        Same keys as AGGREGATOR_OPTIONS in config.py. Missing keys take the default values.
+    """
+
+    def __init__(self, client, options=None):
+        self.client = client
+        self.options = dict(AGGREGATOR_OPTIONS)
+        if options:
+            self.options.update(options)
+        self.devices = {}
+        self.stalls = 0
+        self.batches = 0
+        self.pool_batches = 0
+        self._queue = asyncio.Queue(self.options["queue_size"])
+        self._arrivals = deque()
+        self._pool = None
+        # Batches being decoded in the process pool : (batch, future), oldest first
+        self._pending = deque()
+
+    def _stats(self, device):
+        stats = self.devices.get(device)
+        if stats is None:
+            stats = self.devices[device] = DeviceStats()
+        return stats
+
+    def rate(self, now=None):
+        """
+        Returns the number of frames per second received from all gateways.
+        """
+
+        now = time.monotonic() if now is None else now
+        while self._arrivals and now - self._arrivals[0] > RATE_WINDOW:
+            self._arrivals.popleft()
+        return len(self._arrivals) / RATE_WINDOW
+
+    def metrics(self):
+        """
+        Returns the throughput counters of every gateway, keyed by their <main> prefix.
+        """
+
+        now = time.monotonic()
+        return {device: stats.as_dict(now) for device, stats in self.devices.items()}
+
+    async def ingest(self, topic, payload):
+        """
+        Queues a frame received on <main>trame.
+        Waits while the queue is full, which pauses the reading of the MQTT messages.
+        """
+
+        if not topic.endswith(FRAME_TOPIC):
+            return
+        device = topic[: -len(FRAME_TOPIC)]
+        now = time.monotonic()
+        stats = self._stats(device)
+        stats.arrival(now)
+        self._arrivals.append(now)
+        while now - self._arrivals[0] > RATE_WINDOW:
+            self._arrivals.popleft()
+
+        frame = parse_frame(payload)
+        if frame is None:
+            stats.invalid += 1
+            return
+        # Same frame received twice in a short time : redelivered by the broker or
+        # matched by two overlapping gateway filters. Set dedupe_window above
+        # refresh_time to also drop the unchanged frames sent by a gateway.
+        if frame == stats.last_frame and now - stats.last_frame_time < self.options["dedupe_window"]:
+            stats.duplicates += 1
+            return
+        stats.last_frame = frame
+        stats.last_frame_time = now
+
+        if self._queue.full():
+            self.stalls += 1
+        await self._queue.put((device, frame))
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.options["batch_interval"]
+        while len(batch) < self.options["batch_size"]:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _publish(self, device, decoded_data):
+        stats = self._stats(device)
+        if decoded_data is None:
+            stats.invalid += 1
+            return
+        stats.decoded += 1
+        now = time.monotonic()
+        for topic in decoded_data:
+            value = str(decoded_data[topic])
+            retain = self.options["retain"] and ualdes.should_retain(
+                topic, value, stats.retained, now, self.options["retain_interval"]
+            )
+            await self.client.publish(device + topic, value, retain=retain)
+            stats.published += 1
+
+    async def _publish_batch(self, batch, decoded):
+        for (device, _), decoded_data in zip(batch, decoded):
+            await self._publish(device, decoded_data)
+
+    async def _publish_pending(self):
+        batch, future = self._pending.popleft()
+        await self._publish_batch(batch, await future)
+
+    async def process_batch(self):
+        """
+        Decodes the next batch of queued frames and publishes the decoded fields.
+
+        Above pool_threshold frames per second, each batch is sent whole to one
+        worker of the process pool and up to pool_workers batches are decoded at
+        the same time. The oldest one is published when all the workers are busy
+        or when no other frame is queued.
+        """
+
+        if self._pending and (len(self._pending) >= self.options["pool_workers"] or self._queue.empty()):
+            await self._publish_pending()
+            return
+
+        batch = await self._next_batch()
+        self.batches += 1
+        frames = [frame for _, frame in batch]
+        if self._pool is not None and self.rate() >= self.options["pool_threshold"]:
+            self.pool_batches += 1
+            future = asyncio.get_running_loop().run_in_executor(self._pool, decode_batch, frames)
+            self._pending.append((batch, future))
+            return
+
+        # The batches still in the pool are older, publish them first
+        while self._pending:
+            await self._publish_pending()
+        await self._publish_batch(batch, decode_batch(frames))
+
+    async def _read_loop(self):
+        async for topic, payload in self.client.messages():
+            await self.ingest(topic, payload)
+
+    async def _decode_loop(self):
+        while True:
+            await self.process_batch()
+
+    async def _metrics_loop(self):
+        while True:
+            await asyncio.sleep(self.options["metrics_interval"])
+            for device, values in self.metrics().items():
+                await self.client.publish(device + METRICS_TOPIC, json.dumps(values))
+
+    async def run(self):
+        """
+        Subscribes to the trame topic of every gateway and decodes until cancelled.
+        """
+
+        # The broker may have lost its retained messages (restart without persistence) : retain everything again
+        for stats in self.devices.values():
+            stats.retained.clear()
+        if self.options["pool_workers"] > 0:
+            self._pool = ProcessPoolExecutor(self.options["pool_workers"])
+        for gateway in self.options["gateways"]:
+            await self.client.subscribe(gateway + FRAME_TOPIC)
+
+        tasks = [asyncio.create_task(self._read_loop()), asyncio.create_task(self._decode_loop())]
+        if self.options["metrics_interval"] > 0:
+            tasks.append(asyncio.create_task(self._metrics_loop()))
+        try:
+            # None of the loops is expected to end : stop as soon as one of them
+            # does, so that a failure is raised here instead of stalling the others.
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            self._pending.clear()
+
+
+class LocalBroker:
+    """
+    In-process stand-in for an MQTT broker.
+    Routes the messages between LocalClient instances, keeps retained messages
+    and applies backpressure to the publisher when a subscriber queue is full.
+    Used to run the aggregator without a network.
+    """
+
+    def __init__(self, queue_size=0):
+        self.queue_size = queue_size
+        self.retained = {}
+        self.clients = []
+
+    def client(self):
+        client = LocalClient(self)
+        self.clients.append(client)
+        return client
+
+    async def route(self, topic, msg, retain=False):
+        if isinstance(msg, str):
+            msg = msg.encode()
+        if retain:
+            if msg:
+                self.retained[topic] = msg
+            else:
+                self.retained.pop(topic, None)
+        for client in self.clients:
+            if client.is_subscribed(topic):
+                await client.queue.put((topic, msg))
+
+
+class LocalClient:
+    """
+    Client of a LocalBroker, with the same interface as AiomqttClient.
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.filters = []
+        self.queue = asyncio.Queue(broker.queue_size)
+
+    def is_subscribed(self, topic):
+        return any(topic_matches(topic_filter, topic) for topic_filter in self.filters)
+
+    async def subscribe(self, topic):
+        self.filters.append(topic)
+        for retained_topic, msg in list(self.broker.retained.items()):
+            if topic_matches(topic, retained_topic):
+                await self.queue.put((retained_topic, msg))
+
+    async def publish(self, topic, msg, retain=False):
+        await self.broker.route(topic, msg, retain)
+
+    async def messages(self):
+        while True:
+            yield await self.queue.get()
+
+
+def make_ssl_context(config=MQTT_CONFIG):
+    """
+    Returns the TLS context used to connect to the broker, with the same rules
+    as make_ssl_context() in main.py : ca_file is required unless ssl_insecure is set.
+    :param config: dict with the keys of MQTT_CONFIG
+    :return: ssl.SSLContext
+    """
+
+    if config.get("ca_file"):
+        with open(config["ca_file"], "rb") as f:
+            cadata = f.read()
+        # The same certificate as on the gateways : PEM or DER
+        if cadata.lstrip().startswith(b"-----"):
+            cadata = cadata.decode("ascii")
+        return ssl.create_default_context(cadata=cadata)
+    if config.get("ssl_insecure"):
+        print("WARNING: TLS without broker certificate verification (no ca_file)")
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        return context
+    raise ValueError('MQTT_CONFIG["ca_file"] is required with "ssl": True (or set "ssl_insecure": True)')
+
+
+class AiomqttClient:
+    """
+    Connection to a real MQTT broker, based on the optional aiomqtt package (pip install aiomqtt).
+    Use as an asynchronous context manager.
+
+    aiomqtt keeps the received messages in its own queue while the aggregator
+    is paused. This queue is bounded to queue_size messages, the messages
+    received when it is full are dropped by aiomqtt.
+    """
+
+    def __init__(self, config=MQTT_CONFIG, queue_size=AGGREGATOR_OPTIONS["queue_size"]):
+        import aiomqtt
+
+        self._client = aiomqtt.Client(
+            hostname=config["broker"],
+            port=config["port"],
+            username=config["user"],
+            password=config["password"],
+            identifier=config["client_id"] + "_aggregator",
+            keepalive=config.get("keepalive", 60),
+            max_queued_incoming_messages=queue_size,
+            tls_context=make_ssl_context(config) if config.get("ssl") else None,
+        )
+
+    async def __aenter__(self):
+        await self._client.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return await self._client.__aexit__(*exc_info)
+
+    async def subscribe(self, topic):
+        await self._client.subscribe(topic)
+
+    async def publish(self, topic, msg, retain=False):
+        await self._client.publish(topic, msg, retain=retain)
+
+    async def messages(self):
+        async for message in self._client.messages:
+            yield message.topic.value, bytes(message.payload)
+
+
+async def main():
+    import aiomqtt
+
+    print(f"Aggregator {VERSION} - Release Date : {RELEASE_DATE}")
+    aggregator = None
+    while True:
+        try:
+            async with AiomqttClient() as client:
+                # Keep the same Aggregator across reconnections for its metrics
+                if aggregator is None:
+                    aggregator = Aggregator(client)
+                aggregator.client = client
+                await aggregator.run()
+        except aiomqtt.MqttError as e:
+            print(f"MQTT connection lost : {e}, reconnecting in 5 s")
+            await asyncio.sleep(5)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -14,16 +14,44 @@ MQTT_CONFIG = {
     "client_id": "aldes",
     "user": "mqtt_username",
     "password": "mqtt_password",
-    "ssl": False,
-    "keepalive": 60
+    "ssl": False, # True for MQTT over TLS (port 8883 on most brokers)
+    "ca_file": None, # CA certificate (PEM or DER) copied on the Pico to verify the broker, required with "ssl": True
+    "ssl_insecure": False, # True to allow TLS without ca_file : encrypted but the broker is not authenticated
+    "keepalive": 60 # Time in seconds after which the broker considers the gateway lost and publishes the "offline" last will
 }
 
 # MQTT Topics
 MQTT_TOPICS = {
     "main": "aldes/",
     "command": "aldes/commands",
+    "log_request": "aldes/log/get", # Any message on this topic publishes the log buffer on <main>log
+    "availability": "aldes/status", # Retained "online", "offline" set by the broker (last will) when the gateway is lost
 }
 
 UALDES_OPTIONS = {  
-    "refresh_time": 60 # Time in seconds to refresh data
+    "refresh_time": 60, # Time in seconds to refresh data
+    "decode": True, # False for a thin gateway: only <main>trame is published, decoding is done by aggregator.py
+    "retain": True, # Publish the last known value of the items with "Retain" in ITEMS_MAPPING as retained messages
+    "retain_interval": 300 # Minimum time in seconds between two retained publications of the same topic
+}
+
+# Logging options (ulog.py) : 10 = DEBUG, 20 = INFO, 30 = WARNING, 40 = ERROR
+LOG_OPTIONS = {
+    "level": 20, # Records below this level are ignored, 10 to keep every frame in the buffer
+    "echo_level": 20, # Records from this level are also printed on the USB console, 40 in production
+    "size": 64 # Number of records kept in the ring buffer
+}
+
+# Server-side aggregator options (aggregator.py, runs on CPython, not on the Pico)
+AGGREGATOR_OPTIONS = {
+    "gateways": ["+/"], # <main> prefixes of the gateways to decode, MQTT wildcards allowed
+    "queue_size": 1000, # Frames waiting to be decoded before the MQTT reader is paused
+    "batch_size": 64, # Maximum number of frames decoded together
+    "batch_interval": 0.05, # Time in seconds to wait for a batch to fill up
+    "pool_workers": 0, # Size of the process pool, 0 to always decode in the event loop
+    "pool_threshold": 10000, # Frames per second above which the process pool is used (decoding is ~6 of the ~38 us spent per frame in the event loop, the pool only helps close to saturation)
+    "dedupe_window": 5, # Time in seconds during which an identical frame from the same gateway is dropped (broker redeliveries, overlapping gateway filters), above refresh_time to also drop unchanged frames
+    "retain": True, # Same as UALDES_OPTIONS["retain"], for the decoded fields republished by the aggregator
+    "retain_interval": 300, # Same as UALDES_OPTIONS["retain_interval"]
+    "metrics_interval": 60 # Time in seconds between two publications of <main>metrics, 0 to disable
 }
\ No newline at end of file
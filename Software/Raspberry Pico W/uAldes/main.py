@@ -34,6 +34,7 @@ import network, rp2
 from simple import MQTTClient
 
 import ualdes
+import ulog
 from config import MQTT_CONFIG,MQTT_TOPICS, WIFI_NETWORKS,UALDES_OPTIONS
 
 RELEASE_DATE = "20_05_2025"
@@ -46,13 +47,14 @@ example_serial_input = [0x33, 0xff, 0x4c, 0x33, 0x26, 0x00, 0x01, 0x01, 0x98, 0x
                        0x00, 0x81, 0xc7, 0x2c, 0x01, 0x00, 0x00, 0x00, 0x00, 0xb0, 0xda, 0x38, 0x00, 0x00, 0x00, 0x00, 
                        0x00, 0x40, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x32, 0x7a]
 
-print(f"Release Date : {RELEASE_DATE}")
+ulog.info("Release Date : %s", RELEASE_DATE)
 
 # UART to STM32 setup :   
 uart = UART(0, baudrate=115200, tx=Pin(0), rx=Pin(1))
 
 # Software variables : 
 last_message = 0
+retained = {}  # Last retained publication of each topic : {topic: (value, time)}
 
 led=Pin("LED",Pin.OUT)
 led.off()
@@ -61,82 +63,116 @@ wlan = network.WLAN(network.STA_IF)
 
 wlan.active(True)
 wlan.connect(WIFI_NETWORKS["ssid"], WIFI_NETWORKS["password"])
-print(f"Trying to connect to WiFi...")
+ulog.info("Trying to connect to WiFi...")
 # Add timeout for connection attempts
 max_wait = 10
 while max_wait > 0:
   if wlan.isconnected():
     break
   max_wait -= 1
-  print('Waiting for connection...')
+  ulog.info('Waiting for connection...')
   utime.sleep(1)
 if not wlan.isconnected():
-  print('Failed to connect to WiFi. Restarting...')
+  ulog.error('Failed to connect to WiFi. Restarting...')
   reset()
 led.on()
-print('Connection successful')
-print(wlan.ifconfig())
+ulog.info('Connection successful %s', wlan.ifconfig())
+
+def make_ssl_context():
+  # Built once at startup : the CA certificate is read from flash only once
+  # and the same context is used for every reconnection.
+  import ssl
+  context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+  if MQTT_CONFIG.get("ca_file"):
+    with open(MQTT_CONFIG["ca_file"], "rb") as f:
+      context.load_verify_locations(cadata=f.read())
+    context.verify_mode = ssl.CERT_REQUIRED
+  elif MQTT_CONFIG.get("ssl_insecure"):
+    ulog.warning("TLS without broker certificate verification (no ca_file)")
+    context.verify_mode = ssl.CERT_NONE
+  else:
+    raise ValueError('MQTT_CONFIG["ca_file"] is required with "ssl": True (or set "ssl_insecure": True)')
+  return context
+
+ssl_context = make_ssl_context() if MQTT_CONFIG.get("ssl") else None
 
 def try_reconnect(max_attempts=5):
     global client
     attempts = 0
     while attempts < max_attempts:
         try:
-            print("Tentative de reconnexion MQTT...")
+            ulog.info("Tentative de reconnexion MQTT...")
             client = connect_and_subscribe()
-            print("Reconnexion MQTT réussie")
+            ulog.info("Reconnexion MQTT réussie")
             return
         except Exception as e:
-            print("Échec de reconnexion MQTT :", e)
+            ulog.warning("Échec de reconnexion MQTT : %s", e)
             attempts += 1
             utime.sleep(10)
-    print("Reconnexion impossible. Redémarrage du système.")
+    ulog.error("Reconnexion impossible. Redémarrage du système.")
     reset()
 
 
 
 def connect_and_subscribe():
   global client
-  client = MQTTClient(MQTT_CONFIG["client_id"], MQTT_CONFIG["broker"],MQTT_CONFIG["port"],MQTT_CONFIG["user"],MQTT_CONFIG["password"])
+  client = MQTTClient(MQTT_CONFIG["client_id"], MQTT_CONFIG["broker"],MQTT_CONFIG["port"],MQTT_CONFIG["user"],MQTT_CONFIG["password"], keepalive=MQTT_CONFIG["keepalive"], ssl=ssl_context)
   client.set_callback(sub_cb)
+  # The broker publishes "offline" in place of the gateway if the connection is lost
+  client.set_last_will(MQTT_TOPICS["availability"], "offline", retain=True)
   client.connect(timeout=5)
+  # The broker may have lost its retained messages (restart without persistence) : retain everything again
+  retained.clear()
+  client.publish(MQTT_TOPICS["availability"], "online", retain=True)
+  if ssl_context is not None:
+    ulog.info('TLS handshake: %d ms', client.ssl_handshake_ms)
+    client.publish(MQTT_TOPICS["main"]+"tls_handshake_ms", str(client.ssl_handshake_ms))
   client.subscribe(MQTT_TOPICS["command"])
-  print('Connected to %s, subscribed to %s topic' % (MQTT_CONFIG["broker"], MQTT_TOPICS["command"]))
+  client.subscribe(MQTT_TOPICS["log_request"])
+  ulog.info('Connected to %s, subscribed to %s topic', MQTT_CONFIG["broker"], MQTT_TOPICS["command"])
   return client
 
 def sub_cb(topic, msg):
-  print((topic, msg))
+  ulog.debug("%s %s", topic, msg)
   if topic == (MQTT_TOPICS["command"].encode()):
     led.off()
-    print('Received command: %s' % msg)
+    ulog.info('Received command: %s', msg)
     input_cmd = ualdes.frame_encode(msg)
-    print(input_cmd)
+    ulog.debug("%s", input_cmd)
     if input_cmd != None:      
-       print(uart.write(bytearray(input_cmd)))
+       written = uart.write(bytearray(input_cmd))
+       ulog.debug("UART write: %s", written)
        utime.sleep(0.5)
     led.on()
+  elif topic == (MQTT_TOPICS["log_request"].encode()):
+    # Post-mortem diagnostics : send the whole ring buffer, oldest record first
+    client.publish(MQTT_TOPICS["main"]+"log", "\n".join(ulog.dump()))
 
 # Connect to MQTT broker
 client = None
 try_reconnect()
 
 last_ping = utime.time()
-ping_interval = 30  # Ping toutes les 30 secondes
+# Ping toutes les 30 secondes, toujours en dessous du keepalive pour que le broker
+# ne déclenche le LWT "offline" que si la passerelle est réellement perdue
+ping_interval = 30
+if MQTT_CONFIG["keepalive"] > 0:
+  ping_interval = min(ping_interval, MQTT_CONFIG["keepalive"] // 2)
 
 
 while True:
   # Vérification périodique de la connexion Wi-Fi
   if not wlan.isconnected():
-    print("Wi-Fi déconnecté. Tentative de reconnexion...")
+    ulog.warning("Wi-Fi déconnecté. Tentative de reconnexion...")
     wlan.connect(WIFI_NETWORKS["ssid"], WIFI_NETWORKS["password"])
     for i in range(10):
       if wlan.isconnected():
-        print("Reconnexion Wi-Fi réussie.")
+        ulog.info("Reconnexion Wi-Fi réussie.")
         break
-      print("Attente reconnexion Wi-Fi...")
+      ulog.info("Attente reconnexion Wi-Fi...")
       utime.sleep(1)
     if not wlan.isconnected():
-      print("Impossible de se reconnecter au Wi-Fi. Redémarrage...")
+      ulog.error("Impossible de se reconnecter au Wi-Fi. Redémarrage...")
       reset()
 
   try:
@@ -147,33 +183,34 @@ while True:
     if (utime.time() - last_ping) > ping_interval:
         try:
             client.ping()
-            print("Ping envoyé")
+            ulog.debug("Ping envoyé")
             last_ping = utime.time()
         except Exception as e:
-            print("Erreur ping, tentative de reconnexion...")
+            ulog.warning("Erreur ping, tentative de reconnexion... %s", e)
             try_reconnect()
 
     if (utime.time() - last_message) > UALDES_OPTIONS["refresh_time"]:
         if uart_data is not None:
-            print("Trame recue")
-            print(uart_data)
-            print("Taille : " + str(len(uart_data)))
+            ulog.debug("Trame recue (taille : %d) %s", len(uart_data), uart_data)
             try:
                 led.off()
                 client.publish(MQTT_TOPICS["main"]+"trame", bytearray(uart_data).hex(" "))
-                decoded_data = ualdes.frame_decode(uart_data)
+                # Thin gateway : decoding is left to aggregator.py on the server side
+                decoded_data = ualdes.frame_decode(uart_data) if UALDES_OPTIONS.get("decode", True) else None
                 if decoded_data is not None:  # Check if data was decoded successfully
                     for topic in decoded_data:
-                        client.publish(MQTT_TOPICS["main"]+topic, str(decoded_data[topic]))
-                        print(f"{MQTT_TOPICS['main']}{topic}: {decoded_data[topic]}")
+                        value = str(decoded_data[topic])
+                        retain = UALDES_OPTIONS.get("retain", False) and ualdes.should_retain(topic, value, retained, utime.time(), UALDES_OPTIONS.get("retain_interval", 300))
+                        client.publish(MQTT_TOPICS["main"]+topic, value, retain=retain)
+                        ulog.debug("%s%s: %s", MQTT_TOPICS["main"], topic, decoded_data[topic])
                 last_message = utime.time()
                 utime.sleep(0.2)
                 led.on()
             except Exception as e:
-                print("Error publishing data:", e)
+                ulog.error("Error publishing data: %s", e)
             
   except Exception as e:
     led.off()
-    print('General error:', e)
+    ulog.error('General error: %s', e)
     utime.sleep(10)
     try_reconnect()
\ No newline at end of file
@@ -1,5 +1,6 @@
 import socket
 import struct
+import time
 from binascii import hexlify
 
 
@@ -36,6 +37,7 @@ class MQTTClient:
         self.lw_msg = None
         self.lw_qos = 0
         self.lw_retain = False
+        self.ssl_handshake_ms = None
 
     def _send_str(self, s):
         self.sock.write(struct.pack("!H", len(s)))
@@ -51,6 +53,15 @@ class MQTTClient:
                 return n
             sh += 7
 
+    # Wrap the socket with the SSLContext given as ssl and measure the handshake.
+    # MicroPython v1.25 cannot resume a TLS session : every connect() does a
+    # full handshake.
+    def _wrap_tls(self, sock):
+        start = time.ticks_ms()
+        tls_sock = self.ssl.wrap_socket(sock, server_hostname=self.server)
+        self.ssl_handshake_ms = time.ticks_diff(time.ticks_ms(), start)
+        return tls_sock
+
     def set_callback(self, f):
         self.cb = f
 
@@ -73,7 +84,7 @@ class MQTTClient:
 
             self.sock = ssl.wrap_socket(self.sock, **self.ssl_params)
         elif self.ssl:
-            self.sock = self.ssl.wrap_socket(self.sock, server_hostname=self.server)
+            self.sock = self._wrap_tls(self.sock)
         premsg = bytearray(b"\x10\0\0\0\0\0")
         msg = bytearray(b"\x04MQTT\x04\x02\0\0")
 
@@ -0,0 +1,155 @@
+# Tests of aggregator.py against the in-memory LocalBroker (CPython only).
+# Run from the uAldes directory : python -m pytest tests
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import aggregator
+
+# Example frame of main.py
+FRAME = [0x33, 0xff, 0x4c, 0x33, 0x26, 0x00, 0x01, 0x01, 0x98, 0x03, 0x00, 0x00, 0x88, 0x00, 0x00, 0x28,
+         0x95, 0x03, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0xff, 0x00, 0x00, 0x00, 0x00,
+         0x56, 0x56, 0x56, 0x00, 0x93, 0x8b, 0xff, 0x03, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+         0x00, 0x81, 0xc7, 0x2c, 0x01, 0x00, 0x00, 0x00, 0x00, 0xb0, 0xda, 0x38, 0x00, 0x00, 0x00, 0x00,
+         0x00, 0x40, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x32, 0x7a]
+
+OPTIONS = {"gateways": ["+/"], "pool_workers": 0, "queue_size": 3, "batch_interval": 0.01, "metrics_interval": 0}
+
+
+def frame_payload(t_vmc):
+    frame = list(FRAME)
+    frame[33] = t_vmc
+    frame[-1] = -sum(frame[:-1]) & 0xFF
+    return bytearray(frame).hex(" ")
+
+
+async def wait_for(condition, timeout=2):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timeout"
+        await asyncio.sleep(0.01)
+
+
+async def start(options=OPTIONS):
+    broker = aggregator.LocalBroker()
+    agg = aggregator.Aggregator(broker.client(), options)
+    task = asyncio.create_task(agg.run())
+    await asyncio.sleep(0)
+    return broker, agg, task
+
+
+async def stop(task):
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+def test_frames_through_local_broker():
+    async def scenario():
+        broker, agg, task = await start()
+        gateway = broker.client()
+        await gateway.publish("gw1/trame", frame_payload(0x56))
+        await gateway.publish("gw1/trame", frame_payload(0x56))
+        await gateway.publish("gw1/trame", "zz")
+        await gateway.publish("gw1/trame", "00")
+        await gateway.publish("gw2/trame", frame_payload(0x60))
+        await wait_for(lambda: agg.metrics().get("gw2/", {}).get("decoded") == 1)
+        await stop(task)
+        return broker, agg
+
+    broker, agg = asyncio.run(scenario())
+    assert broker.retained["gw1/T_vmc"] == b"23.0"
+    assert broker.retained["gw2/T_vmc"] == b"28.0"
+    assert broker.retained["gw1/Etat"] == b"1"
+    metrics = agg.metrics()
+    assert metrics["gw1/"]["received"] == 4
+    assert metrics["gw1/"]["duplicates"] == 1
+    assert metrics["gw1/"]["invalid"] == 2
+    assert metrics["gw1/"]["decoded"] == 1
+    assert metrics["gw1/"]["published"] == len(aggregator.ualdes.ITEMS_MAPPING)
+
+
+def test_decode_batch_survives_bad_frame():
+    # b"\x00" has a valid checksum but none of the indexes of ITEMS_MAPPING
+    decoded = aggregator.decode_batch([b"\x00", bytes.fromhex(frame_payload(0x56))])
+    assert decoded[0] is None
+    assert decoded[1]["T_vmc"] == "23.0"
+
+
+def test_run_raises_when_decoding_fails():
+    async def failing_batch():
+        raise RuntimeError("decoder crashed")
+
+    async def scenario():
+        agg = aggregator.Aggregator(aggregator.LocalBroker().client(), OPTIONS)
+        agg.process_batch = failing_batch
+        await asyncio.wait_for(agg.run(), 2)
+
+    with pytest.raises(RuntimeError, match="decoder crashed"):
+        asyncio.run(scenario())
+
+
+def test_retained_values_sent_again_after_reconnect():
+    async def scenario():
+        broker, agg, task = await start()
+        gateway = broker.client()
+        await gateway.publish("gw1/trame", frame_payload(0x56))
+        await wait_for(lambda: "gw1/Soft" in broker.retained)
+        await stop(task)
+
+        # Broker restarted without persistence, then the aggregator reconnects
+        broker.retained.clear()
+        agg.client = broker.client()
+        task = asyncio.create_task(agg.run())
+        await asyncio.sleep(0)
+        await gateway.publish("gw1/trame", frame_payload(0x57))
+        await wait_for(lambda: "gw1/Soft" in broker.retained)
+        await stop(task)
+
+    asyncio.run(scenario())
+
+
+def test_rate_window_stays_bounded_without_pool(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(aggregator.time, "monotonic", lambda: clock[0])
+
+    async def scenario():
+        agg = aggregator.Aggregator(aggregator.LocalBroker().client(), dict(OPTIONS, queue_size=0))
+        for i in range(3000):
+            clock[0] += 1
+            await agg.ingest("gw1/trame", frame_payload(i % 256))
+        return agg
+
+    agg = asyncio.run(scenario())
+    assert len(agg._arrivals) <= aggregator.RATE_WINDOW + 1
+
+
+def test_frames_decoded_in_process_pool_keep_their_order():
+    async def scenario():
+        broker, agg, task = await start(dict(OPTIONS, pool_workers=2, pool_threshold=0, batch_size=1, queue_size=0))
+        sink = broker.client()
+        await sink.subscribe("gw1/T_vmc")
+        gateway = broker.client()
+        for t_vmc in range(0x50, 0x60):
+            await gateway.publish("gw1/trame", frame_payload(t_vmc))
+        await wait_for(lambda: agg.metrics().get("gw1/", {}).get("decoded") == 16, timeout=10)
+        await stop(task)
+        return agg, [sink.queue.get_nowait()[1] for _ in range(sink.queue.qsize())]
+
+    agg, values = asyncio.run(scenario())
+    assert agg.pool_batches > 0
+    assert values == [str(t_vmc * 0.5 - 20).encode() for t_vmc in range(0x50, 0x60)]
+
+
+def test_ssl_context_requires_ca_file():
+    with pytest.raises(ValueError):
+        aggregator.make_ssl_context({"ssl": True, "ca_file": None})
+    context = aggregator.make_ssl_context({"ssl": True, "ca_file": None, "ssl_insecure": True})
+    assert context.verify_mode == aggregator.ssl.CERT_NONE
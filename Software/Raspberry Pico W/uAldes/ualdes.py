@@ -23,7 +23,7 @@ SOFTWARE.
 """
 
 import json
-from config import ITEMS_MAPPING
+import ulog
 """
 UAldes - Python library for Aldes UART Protocol
 
@@ -40,22 +40,22 @@ VERSION = "1.2"
 
 # Try to import ITEMS_MAPPING from config.py, otherwise use local definition
 try:
-    pass
+    from config import ITEMS_MAPPING
 except (ImportError, AttributeError):
     # If config.py doesn't exist or doesn't contain ITEMS_MAPPING, use the local definition
     ITEMS_MAPPING = {
-        "Soft": {"Index": 4, "Type": 5, "Publish": True},
-        "Etat": {"Index": 6, "Type": 0, "Publish": True},
-        "Comp_C": {"Index": 28, "Type": 1, "Publish": True},
-        "Comp_R": {"Index": 29, "Type": 1, "Publish": True},
-        "T_hp": {"Index": 32, "Type": 2, "Publish": True},
-        "T_vmc": {"Index": 33, "Type": 2, "Publish": True},
-        "T_evap": {"Index": 34, "Type": 2, "Publish": True},
-        "T_haut": {"Index": 36, "Type": 2, "Publish": True},
-        "T_bas": {"Index": 37, "Type": 2, "Publish": True},
-        "DP": {"Index": 38, "Type": 0, "Publish": True},
-        "Ventil_flow": {"Index": 39, "Type": 4, "Publish": True},
-        "Ventil_rpm": {"Index": 40, "Type": 3, "Publish": True},
+        "Soft": {"Index": 4, "Type": 5, "Publish": True, "Retain": True},
+        "Etat": {"Index": 6, "Type": 0, "Publish": True, "Retain": True},
+        "Comp_C": {"Index": 28, "Type": 1, "Publish": True, "Retain": True},
+        "Comp_R": {"Index": 29, "Type": 1, "Publish": True, "Retain": True},
+        "T_hp": {"Index": 32, "Type": 2, "Publish": True, "Retain": True},
+        "T_vmc": {"Index": 33, "Type": 2, "Publish": True, "Retain": True},
+        "T_evap": {"Index": 34, "Type": 2, "Publish": True, "Retain": True},
+        "T_haut": {"Index": 36, "Type": 2, "Publish": True, "Retain": True},
+        "T_bas": {"Index": 37, "Type": 2, "Publish": True, "Retain": True},
+        "DP": {"Index": 38, "Type": 0, "Publish": True, "Retain": True},
+        "Ventil_flow": {"Index": 39, "Type": 4, "Publish": True, "Retain": True},
+        "Ventil_rpm": {"Index": 40, "Type": 3, "Publish": True, "Retain": True},
     }
 
 def aldes_checksum(data):
@@ -90,15 +90,15 @@ def aldes_checksum_test(data):
 
     Notes
     -----
-    The function also prints "Checksum OK" if the checksum is valid, 
-    or "Checksum KO" if it is invalid.
+    The function also logs "Checksum OK" or "Checksum KO" (DEBUG). An invalid
+    frame is reported once, as a WARNING, by frame_decode.
     """
 
     if (-sum(data[:-1]) & 0xFF) == data[-1]:
-        print("Checksum OK")
+        ulog.debug("Checksum OK")
         return True
     else:
-        print("Checksum KO")
+        ulog.debug("Checksum KO")
         return False
 
 def frame_encode(command):
@@ -182,7 +182,7 @@ def frame_encode(command):
         return base_frame
 
     except :
-        print("Invalid command")
+        ulog.warning("Invalid command: %s", command)
         return None
 
 def decode_temperature_bcd(value):
@@ -264,13 +264,41 @@ def decode_value(value,type):
     else:
         return str(value)
 
+def should_retain(topic, value, retained, now, min_interval):
+    """
+    Tells if a decoded value has to be published with the retain flag.
+
+    Only the topics with "Retain" set in ITEMS_MAPPING are retained. To keep the
+    number of writes to the broker storage bounded, a topic is retained again
+    only when its value changed and at least min_interval seconds elapsed since
+    its last retained publication. Other publications are sent without retain.
+
+    Parameters:
+        topic (str): Name of the item in ITEMS_MAPPING (e.g. "T_hp").
+        value (str): Decoded value, as returned by frame_decode.
+        retained (dict): Last retained publications {topic: (value, time)}, updated in place.
+        now (int or float): Current time in seconds.
+        min_interval (int or float): Minimum time in seconds between two retained publications of a topic.
+
+    Returns:
+        bool: True if the value has to be published with retain=True.
+    """
+
+    if not ITEMS_MAPPING.get(topic, {}).get("Retain", False):
+        return False
+    last = retained.get(topic)
+    if last is not None and (last[0] == value or now - last[1] < min_interval):
+        return False
+    retained[topic] = (value, now)
+    return True
+
 def frame_decode(data):
     """
     Decodes a given data frame into a dictionary of interpreted values.
 
     The function checks the validity of the input data frame using a checksum test.
     If the frame is valid, it decodes the values based on predefined mappings and types.
-    If the frame is invalid, it sets the "Etat" key in the decoded frame to 0 and prints an error message.
+    If the frame is invalid, it sets the "Etat" key in the decoded frame to 0 and logs an error message.
 
     Args:
         data (list): A list of integers representing the data frame to be decoded.
@@ -294,7 +322,7 @@ def frame_decode(data):
 
     else:
         decoded_frame = None
-        print("Invalid frame")
+        ulog.warning("Invalid frame (checksum KO)")
 
     return decoded_frame
 
@@ -0,0 +1,142 @@
+"""
+MIT License
+
+Copyright (c) 2025 Yann DOUBLET
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import time
+"""
+ULog - Lightweight logging for the uAldes gateway
+
+Records are kept in a preallocated ring buffer holding the last events, and
+only printed on the USB console when their level reaches LOG_OPTIONS["echo_level"].
+Messages are formatted with their arguments ("%s" style) only when the buffer
+is read, so a filtered out call costs a comparison and an enabled one a tuple.
+
+The buffer can be read on demand over MQTT (see main.py), or with dump().
+
+Author: Yann DOUBLET
+License: MIT
+"""
+
+try:
+    from micropython import const
+except ImportError:
+    # CPython (aggregator.py)
+    def const(value):
+        return value
+
+try:
+    from time import ticks_ms
+except ImportError:
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+
+DEBUG = const(10)
+INFO = const(20)
+WARNING = const(30)
+ERROR = const(40)
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+# Try to import LOG_OPTIONS from config.py, otherwise use local definition
+try:
+    from config import LOG_OPTIONS
+except (ImportError, AttributeError):
+    LOG_OPTIONS = {
+        "level": INFO,
+        "echo_level": INFO,
+        "size": 64,
+    }
+
+level = LOG_OPTIONS["level"]
+echo_level = LOG_OPTIONS["echo_level"]
+_buffer = [None] * LOG_OPTIONS["size"]
+_index = 0
+
+
+def _record(record_level, msg, args):
+    global _index
+    entry = (ticks_ms(), record_level, msg, args)
+    _buffer[_index] = entry
+    _index += 1
+    if _index == len(_buffer):
+        _index = 0
+    if record_level >= echo_level:
+        print(format_entry(entry))
+
+
+def debug(msg, *args):
+    if level <= DEBUG:
+        _record(DEBUG, msg, args)
+
+
+def info(msg, *args):
+    if level <= INFO:
+        _record(INFO, msg, args)
+
+
+def warning(msg, *args):
+    if level <= WARNING:
+        _record(WARNING, msg, args)
+
+
+def error(msg, *args):
+    if level <= ERROR:
+        _record(ERROR, msg, args)
+
+
+def format_entry(entry):
+    """
+    Returns a record of the ring buffer as a line of text.
+    :param entry: tuple (ticks_ms, level, msg, args)
+    :return: str "<ticks_ms> <LEVEL> <message>"
+    """
+
+    ticks, record_level, msg, args = entry
+    if args:
+        try:
+            msg = msg % args
+        except (TypeError, ValueError):
+            msg = "%s %s" % (msg, args)
+    return "%d %s %s" % (ticks, LEVEL_NAMES.get(record_level, record_level), msg)
+
+
+def dump():
+    """
+    Returns the records of the ring buffer, oldest first.
+    :return: list of str, see format_entry
+    """
+
+    size = len(_buffer)
+    entries = [_buffer[(_index + i) % size] for i in range(size)]
+    return [format_entry(entry) for entry in entries if entry is not None]
+
+
+def clear():
+    """
+    Empties the ring buffer.
+    """
+
+    global _index
+    for i in range(len(_buffer)):
+        _buffer[i] = None
+    _index = 0